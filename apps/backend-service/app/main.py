@@ -9,145 +9,29 @@ Demonstrates:
 """
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import Response
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from fastapi.responses import JSONResponse, StreamingResponse
+from prometheus_client import Counter, Histogram
 import time
 import os
-import json
+import math
+import asyncio
+import random
 import logging
-from datetime import datetime
+import contextvars
+from collections import deque
+import anyio
 import httpx
 from typing import Optional
 
-from opentelemetry import trace, context
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
-from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
-from opentelemetry.propagate import set_global_textmap, get_global_textmap
-
-# Custom JSON formatter for structured logging with trace correlation
-class StructuredJSONFormatter(logging.Formatter):
-    """
-    Structured JSON log formatter compatible with ECS (Elastic Common Schema)
-    Includes trace context for log-trace correlation
-    """
-    
-    def format(self, record):
-        # Get current trace context
-        current_span = trace.get_current_span()
-        trace_id = None
-        span_id = None
-        
-        if current_span and current_span.get_span_context().is_valid:
-            ctx = current_span.get_span_context()
-            trace_id = format(ctx.trace_id, '032x')
-            span_id = format(ctx.span_id, '016x')
-        
-        # Build structured log entry
-        log_data = {
-            # Timestamp
-            "@timestamp": datetime.utcnow().isoformat() + "Z",
-            "timestamp": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
-            
-            # Log metadata
-            "log": {
-                "level": record.levelname,
-                "logger": record.name,
-                "origin": {
-                    "file": {
-                        "name": record.filename,
-                        "line": record.lineno
-                    },
-                    "function": record.funcName
-                }
-            },
-            
-            # Message
-            "message": record.getMessage(),
-            
-            # Service metadata
-            "service": {
-                "name": os.getenv("SERVICE_NAME", "backend-service"),
-                "version": os.getenv("SERVICE_VERSION", "1.0.0"),
-                "environment": os.getenv("ENVIRONMENT", "development")
-            },
-            
-            # Trace context (for log-trace correlation)
-            "trace": {
-                "id": trace_id,
-                "span_id": span_id
-            } if trace_id else {},
-            
-            # Process metadata
-            "process": {
-                "pid": os.getpid()
-            },
-            
-            # Host metadata
-            "host": {
-                "hostname": os.getenv("HOSTNAME", "localhost")
-            }
-        }
-        
-        # Add exception info if present
-        if record.exc_info:
-            log_data["error"] = {
-                "type": record.exc_info[0].__name__ if record.exc_info[0] else None,
-                "message": str(record.exc_info[1]) if record.exc_info[1] else None,
-                "stack_trace": self.formatException(record.exc_info)
-            }
-        
-        # Add custom fields from extra
-        if hasattr(record, 'extra_fields'):
-            log_data.update(record.extra_fields)
-        
-        return json.dumps(log_data)
-
-
-# Configure structured logging
-def setup_logging():
-    """Configure structured JSON logging"""
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    # Remove default handlers
-    logger.handlers = []
-    
-    # Add JSON handler
-    handler = logging.StreamHandler()
-    handler.setFormatter(StructuredJSONFormatter())
-    logger.addHandler(handler)
-    
-    return logging.getLogger(__name__)
-
+from opentelemetry import trace
 
-logger = setup_logging()
+# Shared instrumentation bootstrap (apps/shared/observability)
+from observability import latency_buckets, setup_observability
 
-# Configure OpenTelemetry
-resource = Resource.create({
-    "service.name": os.getenv("SERVICE_NAME", "backend-service"),
-    "service.version": os.getenv("SERVICE_VERSION", "1.0.0"),
-    "deployment.environment": os.getenv("ENVIRONMENT", "development")
-})
-
-trace.set_tracer_provider(TracerProvider(resource=resource))
+observability = setup_observability("backend-service")
+logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
-# Configure OTLP exporter
-otlp_exporter = OTLPSpanExporter(
-    endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://otel-collector:4317"),
-    insecure=True
-)
-span_processor = BatchSpanProcessor(otlp_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-# Set global propagator for context propagation
-set_global_textmap(TraceContextTextMapPropagator())
-
 # Prometheus metrics for distributed systems
 REQUEST_COUNT = Counter(
     'http_requests_total',
@@ -158,7 +42,8 @@ REQUEST_COUNT = Counter(
 REQUEST_DURATION = Histogram(
     'http_request_duration_seconds',
     'HTTP request duration',
-    ['method', 'endpoint', 'service']
+    ['method', 'endpoint', 'service'],
+    buckets=latency_buckets("REQUEST_DURATION_BUCKETS")
 )
 
 UPSTREAM_REQUEST_COUNT = Counter(
@@ -170,7 +55,50 @@ UPSTREAM_REQUEST_COUNT = Counter(
 UPSTREAM_REQUEST_DURATION = Histogram(
     'upstream_request_duration_seconds',
     'Upstream service request duration',
-    ['upstream_service', 'method']
+    ['upstream_service', 'method'],
+    buckets=latency_buckets("UPSTREAM_REQUEST_DURATION_BUCKETS")
+)
+
+UPSTREAM_HEDGES_FIRED = Counter(
+    'upstream_hedged_requests_total',
+    'Hedged (second) upstream requests sent',
+    ['upstream_service']
+)
+
+UPSTREAM_HEDGES_WON = Counter(
+    'upstream_hedge_wins_total',
+    'Hedged upstream requests that answered before the original attempt',
+    ['upstream_service']
+)
+
+UPSTREAM_HEDGES_WASTED = Counter(
+    'upstream_hedge_wasted_requests_total',
+    'Hedged upstream requests whose result was discarded because the original attempt won',
+    ['upstream_service']
+)
+
+UPSTREAM_HEDGES_BUDGET_EXHAUSTED = Counter(
+    'upstream_hedges_budget_exhausted_total',
+    'Hedges skipped because the hedging budget was exhausted',
+    ['upstream_service']
+)
+
+UPSTREAM_RETRIES = Counter(
+    'upstream_retries_total',
+    'Upstream request retries',
+    ['upstream_service', 'reason']
+)
+
+UPSTREAM_RETRY_BUDGET_EXHAUSTED = Counter(
+    'upstream_retry_budget_exhausted_total',
+    'Upstream retries skipped because the retry budget was exhausted',
+    ['upstream_service']
+)
+
+DEADLINE_EXCEEDED = Counter(
+    'request_deadline_exceeded_total',
+    'Requests abandoned because their propagated deadline expired',
+    ['stage', 'service']
 )
 
 # Create FastAPI app
@@ -180,38 +108,427 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Instrument FastAPI and HTTPX with OpenTelemetry
-FastAPIInstrumentor.instrument_app(app)
-HTTPXClientInstrumentor().instrument()
 
 # Configuration
 FRONTEND_SERVICE_URL = os.getenv("FRONTEND_SERVICE_URL", "http://fastapi-app:8000")
 
+# Proxy mode for /call-frontend/{endpoint}: "wrap" decodes the upstream JSON
+# into a response envelope, "passthrough" streams the upstream bytes as-is
+FRONTEND_PROXY_MODE = os.getenv("FRONTEND_PROXY_MODE", "wrap")
+
+# Upstream response headers forwarded to the client in passthrough mode
+# (hop-by-hop headers such as connection/transfer-encoding are never forwarded)
+PASSTHROUGH_RESPONSE_HEADERS = [
+    header.strip().lower()
+    for header in os.getenv(
+        "PASSTHROUGH_RESPONSE_HEADERS",
+        "content-type,content-length,content-encoding,cache-control,etag,last-modified"
+    ).split(",")
+    if header.strip()
+]
+
+# Request hedging for idempotent upstream GETs (opt-in)
+UPSTREAM_HEDGING_ENABLED = os.getenv("UPSTREAM_HEDGING_ENABLED", "false").lower() == "true"
+# Fixed hedge delay; when unset the delay follows a rolling latency percentile
+UPSTREAM_HEDGE_DELAY_MS = os.getenv("UPSTREAM_HEDGE_DELAY_MS")
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_LATENCY_WINDOW_SECONDS = float(os.getenv("UPSTREAM_LATENCY_WINDOW_SECONDS", "60"))
+# How often the adaptive hedge delay is recomputed from the window
+UPSTREAM_HEDGE_REFRESH_SECONDS = float(os.getenv("UPSTREAM_HEDGE_REFRESH_SECONDS", "1"))
+# Upstream paths with their own latency window; further paths are not hedged adaptively
+UPSTREAM_LATENCY_MAX_PATHS = int(os.getenv("UPSTREAM_LATENCY_MAX_PATHS", "100"))
+# Window for the per-route quantiles served by /debug/latency
+LATENCY_WINDOW_SECONDS = float(os.getenv("LATENCY_WINDOW_SECONDS", "60"))
+DEBUG_LATENCY_PERCENTILES = [50, 99, 99.9]
+# Hedges earned per upstream request, and the maximum that can be saved up
+UPSTREAM_HEDGE_BUDGET_RATIO = float(os.getenv("UPSTREAM_HEDGE_BUDGET_RATIO", "0.1"))
+UPSTREAM_HEDGE_BUDGET_BURST = float(os.getenv("UPSTREAM_HEDGE_BUDGET_BURST", "10"))
+
+# Deadline propagation: the header carries the caller's remaining budget in ms
+DEADLINE_HEADER = os.getenv("DEADLINE_HEADER", "x-request-timeout-ms")
+# Budget for requests that arrive without a deadline header (empty = unbounded)
+DEFAULT_REQUEST_TIMEOUT_MS = os.getenv("DEFAULT_REQUEST_TIMEOUT_MS", "10000")
+
+# Retries of failed upstream GETs, bounded by a token-bucket retry budget
+UPSTREAM_RETRY_BUDGET_RATIO = float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.1"))
+UPSTREAM_RETRY_BUDGET_BURST = float(os.getenv("UPSTREAM_RETRY_BUDGET_BURST", "10"))
+UPSTREAM_RETRY_BACKOFF_MS = float(os.getenv("UPSTREAM_RETRY_BACKOFF_MS", "25"))
+# Per-request ceiling so one failing call cannot drain the shared retry budget
+UPSTREAM_RETRY_MAX_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_MAX_ATTEMPTS", "3"))
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# Absolute deadline (time.monotonic()) of the request being handled
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the propagated request deadline has expired"""
+
+
+class RollingWindow:
+    """
+    Time-bounded window of recent observations with percentile lookup.
+    Complements the cumulative Prometheus histograms with a live view.
+    """
+    
+    def __init__(self, window_seconds: float, max_samples: int = 10000):
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        self._cached = {}
+    
+    def observe(self, value: float):
+        self.samples.append((time.monotonic(), value))
+    
+    def _prune(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+    
+    def __len__(self):
+        self._prune()
+        return len(self.samples)
+    
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, None when empty"""
+        self._prune()
+        if not self.samples:
+            return None
+        return self._nearest_rank(sorted(value for _, value in self.samples), percentile)
+    
+    def cached_percentile(self, percentile: float, min_samples: int, max_age: float) -> Optional[float]:
+        """
+        percentile(), recomputed at most every max_age seconds so hot paths
+        don't sort the whole window. None while there are fewer than min_samples.
+        """
+        now = time.monotonic()
+        cached = self._cached.get(percentile)
+        if cached is None or now - cached[0] >= max_age:
+            value = self.percentile(percentile) if len(self) >= min_samples else None
+            cached = self._cached[percentile] = (now, value)
+        return cached[1]
+    
+    def summary(self, percentiles: list) -> dict:
+        """Sample count and several percentiles (in ms) from a single sort"""
+        self._prune()
+        values = sorted(value for _, value in self.samples)
+        result = {"count": len(values)}
+        for percentile in percentiles:
+            value = self._nearest_rank(values, percentile) if values else None
+            result[f"p{str(percentile).replace('.', '')}_ms"] = value * 1000 if value is not None else None
+        return result
+    
+    @staticmethod
+    def _nearest_rank(values: list, percentile: float) -> float:
+        # Rounded so float error (99.9 / 100 * 1000 = 999.0000000000001) doesn't bump the rank
+        rank = math.ceil(round(percentile / 100 * len(values), 9))
+        return values[min(max(rank, 1), len(values)) - 1]
+
+
+class TokenBucketBudget:
+    """
+    Token bucket capping extra upstream load to a fraction of regular traffic.
+    Every request deposits `ratio` tokens (up to `max_tokens`) and every extra
+    attempt withdraws one. Only touched from the event loop, so no locking.
+    """
+    
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+    
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+    
+    def try_withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+# Per-attempt upstream latency by request path, feeding the adaptive hedge delay
+upstream_latency: dict[str, RollingWindow] = {}
+# Per-route request latency for the /debug/latency endpoint
+route_latency: dict[str, RollingWindow] = {}
+hedge_budget = TokenBucketBudget(UPSTREAM_HEDGE_BUDGET_RATIO, UPSTREAM_HEDGE_BUDGET_BURST)
+retry_budget = TokenBucketBudget(UPSTREAM_RETRY_BUDGET_RATIO, UPSTREAM_RETRY_BUDGET_BURST)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current request's deadline, None if unbounded"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def upstream_deadline() -> tuple[Optional[float], dict]:
+    """
+    Timeout and headers for an upstream call, derived from what is left of
+    the current request's budget. Raises DeadlineExceeded once it is spent.
+    """
+    remaining = remaining_budget()
+    if remaining is None:
+        return None, {}
+    if remaining <= 0:
+        observability.inc(DEADLINE_EXCEEDED, stage="upstream_call", service="backend-service")
+        raise DeadlineExceeded("request deadline exceeded before upstream call")
+    return remaining, {DEADLINE_HEADER: str(int(remaining * 1000))}
+
+
+async def deadline_get(
+    client: httpx.AsyncClient,
+    url: str,
+    record_latency: bool = True
+) -> httpx.Response:
+    """
+    Single upstream GET bounded by, and forwarding, the request deadline.
+    With record_latency, the attempt's latency feeds the adaptive hedge delay.
+    An attempt that is cancelled or times out records its elapsed time as a
+    lower bound, so slow attempts still reach the window instead of vanishing.
+    """
+    timeout, headers = upstream_deadline()
+    start_time = time.monotonic()
+    # Fast failures (refused connections, resets) say nothing about how long
+    # an answer takes, so they are left out
+    record_latency_on_exit = record_latency
+    try:
+        if timeout is None:
+            return await client.get(url)
+        return await asyncio.wait_for(
+            client.get(url, headers=headers, timeout=httpx.Timeout(timeout)),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        observability.inc(DEADLINE_EXCEEDED, stage="upstream_call", service="backend-service")
+        raise DeadlineExceeded("request deadline exceeded during upstream call")
+    except httpx.TransportError as e:
+        if not isinstance(e, httpx.TimeoutException):
+            record_latency_on_exit = False
+        raise
+    finally:
+        if record_latency_on_exit:
+            observe_attempt_latency(httpx.URL(url).path, time.monotonic() - start_time)
+
+
+def observe_attempt_latency(path: str, duration: float):
+    """Record a single upstream attempt in the rolling window for its path"""
+    window = upstream_latency.get(path)
+    if window is None:
+        if len(upstream_latency) >= UPSTREAM_LATENCY_MAX_PATHS:
+            return
+        window = upstream_latency[path] = RollingWindow(UPSTREAM_LATENCY_WINDOW_SECONDS)
+    window.observe(duration)
+
+
+def observe_upstream_duration(upstream_service: str, method: str, duration: float):
+    """Record a whole upstream call (including hedges and retries) in Prometheus"""
+    observability.observe(
+        UPSTREAM_REQUEST_DURATION,
+        duration,
+        upstream_service=upstream_service,
+        method=method
+    )
+
+
+def hedge_delay_seconds(path: str) -> Optional[float]:
+    """Delay before hedging, or None while there is too little latency data"""
+    if UPSTREAM_HEDGE_DELAY_MS:
+        return float(UPSTREAM_HEDGE_DELAY_MS) / 1000
+    window = upstream_latency.get(path)
+    if window is None:
+        return None
+    return window.cached_percentile(
+        UPSTREAM_HEDGE_PERCENTILE,
+        UPSTREAM_HEDGE_MIN_SAMPLES,
+        UPSTREAM_HEDGE_REFRESH_SECONDS
+    )
+
+
+async def hedged_get(
+    client: httpx.AsyncClient,
+    url: str,
+    upstream_service: str = "frontend-service"
+) -> httpx.Response:
+    """
+    GET with optional request hedging. If the first attempt has not answered
+    within the hedge delay, a second attempt is sent; whichever answers first
+    wins and the other is cancelled. Only use for idempotent requests.
+    The hedge budget is fed once per logical request by upstream_get.
+    """
+    if not UPSTREAM_HEDGING_ENABLED:
+        return await deadline_get(client, url)
+    
+    delay = hedge_delay_seconds(httpx.URL(url).path)
+    if delay is None:
+        return await deadline_get(client, url)
+    
+    primary = asyncio.ensure_future(deadline_get(client, url))
+    pending = {primary}
+    error = None
+    # Outstanding attempts are cancelled however we leave, including when
+    # the handler itself is cancelled while waiting
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+        
+        span = trace.get_current_span()
+        if not hedge_budget.try_withdraw():
+            observability.inc(UPSTREAM_HEDGES_BUDGET_EXHAUSTED, upstream_service=upstream_service)
+            span.add_event("hedge_skipped", {"reason": "budget_exhausted"})
+            return await primary
+        
+        observability.inc(UPSTREAM_HEDGES_FIRED, upstream_service=upstream_service)
+        span.add_event("hedge_fired", {"hedge.delay_ms": delay * 1000})
+        # Only first attempts feed the latency window: a hedge cancelled
+        # because the primary answered would record a misleadingly short time
+        hedge = asyncio.ensure_future(deadline_get(client, url, record_latency=False))
+        pending = {primary, hedge}
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer a successful attempt; only fail once both attempts failed
+            for task in sorted(done, key=lambda t: t.exception() is not None):
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                
+                hedge_won = task is hedge
+                if hedge_won:
+                    observability.inc(UPSTREAM_HEDGES_WON, upstream_service=upstream_service)
+                else:
+                    observability.inc(UPSTREAM_HEDGES_WASTED, upstream_service=upstream_service)
+                span.set_attribute("upstream.hedge_won", hedge_won)
+                return task.result()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def upstream_get(
+    client: httpx.AsyncClient,
+    url: str,
+    upstream_service: str = "frontend-service"
+) -> httpx.Response:
+    """
+    Idempotent upstream GET with deadline propagation, hedging and retries.
+    Transport errors and 502/503/504 responses are retried while the request
+    deadline, the shared retry budget and the per-request attempt ceiling
+    all allow it.
+    """
+    # Both budgets earn tokens per logical request, not per attempt, so
+    # retries don't inflate the hedge allowance
+    retry_budget.deposit()
+    if UPSTREAM_HEDGING_ENABLED:
+        hedge_budget.deposit()
+    span = trace.get_current_span()
+    backoff = UPSTREAM_RETRY_BACKOFF_MS / 1000
+    attempt = 0
+    
+    while True:
+        attempt += 1
+        response = None
+        try:
+            response = await hedged_get(client, url, upstream_service)
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                return response
+            reason = f"status_{response.status_code}"
+        except httpx.TransportError as e:
+            error = e
+            reason = type(e).__name__
+        
+        if attempt >= UPSTREAM_RETRY_MAX_ATTEMPTS:
+            span.add_event("retry_skipped", {"reason": "max_attempts", "attempt": attempt})
+            if response is not None:
+                return response
+            raise error
+        
+        # Full jitter keeps retries from synchronising across replicas; a retry
+        # is only worth it if the backoff leaves budget for another attempt
+        delay = random.uniform(0, backoff * 2 ** (attempt - 1))
+        remaining = remaining_budget()
+        if remaining is not None and delay >= remaining:
+            if response is not None:
+                return response
+            observability.inc(DEADLINE_EXCEEDED, stage="upstream_retry", service="backend-service")
+            raise DeadlineExceeded("request deadline exceeded while retrying upstream call") from error
+        
+        if not retry_budget.try_withdraw():
+            observability.inc(UPSTREAM_RETRY_BUDGET_EXHAUSTED, upstream_service=upstream_service)
+            span.add_event("retry_skipped", {"reason": "budget_exhausted", "attempt": attempt})
+            if response is not None:
+                return response
+            raise error
+        
+        observability.inc(UPSTREAM_RETRIES, upstream_service=upstream_service, reason=reason)
+        span.add_event("retry", {"reason": reason, "attempt": attempt})
+        logger.warning(f"Retrying upstream call to {url} ({reason})", extra={
+            "extra_fields": {
+                "event": {"action": "upstream_call_retry"},
+                "upstream": {"service": upstream_service, "attempt": attempt, "reason": reason}
+            }
+        })
+        await asyncio.sleep(delay)
+
+
+@app.middleware("http")
+async def deadline_middleware(request: Request, call_next):
+    """
+    Start the request's deadline clock from the incoming deadline header
+    (or DEFAULT_REQUEST_TIMEOUT_MS) and reject requests that arrive expired
+    """
+    budget_ms = request.headers.get(DEADLINE_HEADER) or DEFAULT_REQUEST_TIMEOUT_MS
+    if not budget_ms:
+        return await call_next(request)
+    
+    try:
+        budget = float(budget_ms) / 1000
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": f"Invalid {DEADLINE_HEADER} header: {budget_ms}"}
+        )
+    
+    if budget <= 0:
+        observability.inc(DEADLINE_EXCEEDED, stage="arrival", service="backend-service")
+        return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+    
+    token = request_deadline.set(time.monotonic() + budget)
+    try:
+        return await call_next(request)
+    finally:
+        request_deadline.reset(token)
+
 
 @app.middleware("http")
 async def logging_middleware(request: Request, call_next):
     """Log all requests with trace context"""
     start_time = time.time()
     
-    # Get trace context
-    current_span = trace.get_current_span()
-    trace_id = None
-    span_id = None
-    
-    if current_span and current_span.get_span_context().is_valid:
-        ctx = current_span.get_span_context()
-        trace_id = format(ctx.trace_id, '032x')
-        span_id = format(ctx.span_id, '016x')
+    # Trace context of the server span, reused as the latency exemplar
+    # (log records pick up the trace context in the formatter)
+    exemplar = {}
+    ctx = trace.get_current_span().get_span_context()
+    if ctx.is_valid and ctx.trace_flags.sampled:
+        exemplar = {"trace_id": format(ctx.trace_id, '032x')}
     
     # Log request start
+    http_request = {
+        "method": request.method,
+        "path": request.url.path
+    }
+    headers = observability.request_headers(request)
+    if headers is not None:
+        http_request["headers"] = headers
     log_extra = {
         "extra_fields": {
             "http": {
-                "request": {
-                    "method": request.method,
-                    "path": request.url.path,
-                    "headers": dict(request.headers)
-                }
+                "request": http_request
             },
             "event": {
                 "action": "http_request_start"
@@ -225,18 +542,30 @@ async def logging_middleware(request: Request, call_next):
     duration = time.time() - start_time
     
     # Update metrics
-    REQUEST_COUNT.labels(
+    observability.inc(
+        REQUEST_COUNT,
         method=request.method,
         endpoint=request.url.path,
         status=response.status_code,
         service="backend-service"
-    ).inc()
-    
-    REQUEST_DURATION.labels(
+    )
+    observability.observe(
+        REQUEST_DURATION,
+        duration,
+        exemplar=exemplar,
         method=request.method,
         endpoint=request.url.path,
         service="backend-service"
-    ).observe(duration)
+    )
+    
+    if observability.config.metrics_enabled:
+        with observability.overhead.measure("metrics"):
+            # Keyed by route template so path parameters don't explode the windows
+            route = request.scope.get("route")
+            route_key = f"{request.method} {route.path if route else 'unmatched'}"
+            if route_key not in route_latency:
+                route_latency[route_key] = RollingWindow(LATENCY_WINDOW_SECONDS)
+            route_latency[route_key].observe(duration)
     
     # Log request completion
     log_extra = {
@@ -265,6 +594,11 @@ async def logging_middleware(request: Request, call_next):
     return response
 
 
+# Instrument FastAPI last so its server span is the outermost middleware and
+# the trace ID is available to the logging/metrics middleware (logs, exemplars)
+observability.instrument_app(app)
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -286,7 +620,9 @@ async def root():
                 "/call-frontend",
                 "/call-frontend/redis",
                 "/call-frontend/postgres",
-                "/distributed-trace"
+                "/distributed-trace",
+                "/debug/latency",
+                "/debug/instrumentation"
             ]
         }
 
@@ -302,9 +638,41 @@ async def health():
 
 
 @app.get("/metrics")
-async def metrics():
-    """Prometheus metrics endpoint"""
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+async def metrics(request: Request):
+    """
+    Prometheus metrics endpoint
+    Serves OpenMetrics (with trace exemplars) when the scraper asks for it
+    """
+    return observability.metrics_response(request)
+
+
+@app.get("/debug/instrumentation")
+async def debug_instrumentation():
+    """Effective observability configuration and per-layer overhead"""
+    return observability.report()
+
+
+@app.get("/debug/latency")
+async def debug_latency():
+    """
+    Rolling-window latency quantiles per route and for upstream calls
+    For live debugging without PromQL; not a replacement for the histograms
+    """
+    return {
+        "service": "backend-service",
+        "window_seconds": LATENCY_WINDOW_SECONDS,
+        "routes": {
+            route_key: window.summary(DEBUG_LATENCY_PERCENTILES)
+            for route_key, window in sorted(route_latency.items())
+        },
+        "upstream": {
+            "window_seconds": UPSTREAM_LATENCY_WINDOW_SECONDS,
+            "frontend-service": {
+                path: window.summary(DEBUG_LATENCY_PERCENTILES)
+                for path, window in sorted(upstream_latency.items())
+            }
+        }
+    }
 
 
 @app.get("/call-frontend")
@@ -329,21 +697,19 @@ async def call_frontend():
             
             async with httpx.AsyncClient() as client:
                 # Context is automatically propagated via HTTPXClientInstrumentor
-                response = await client.get(f"{FRONTEND_SERVICE_URL}/")
+                response = await upstream_get(client, f"{FRONTEND_SERVICE_URL}/")
                 
             duration = time.time() - start_time
             
             # Update upstream metrics
-            UPSTREAM_REQUEST_COUNT.labels(
+            observability.inc(
+                UPSTREAM_REQUEST_COUNT,
                 upstream_service="frontend-service",
                 method="GET",
                 status=response.status_code
-            ).inc()
+            )
             
-            UPSTREAM_REQUEST_DURATION.labels(
-                upstream_service="frontend-service",
-                method="GET"
-            ).observe(duration)
+            observe_upstream_duration("frontend-service", "GET", duration)
             
             logger.info("Frontend service responded", extra={
                 "extra_fields": {
@@ -363,6 +729,19 @@ async def call_frontend():
                 "response_time_ms": duration * 1000
             }
             
+        except DeadlineExceeded as e:
+            span.set_attribute("error", True)
+            span.record_exception(e)
+            
+            logger.warning(f"Deadline exceeded calling frontend service: {str(e)}", extra={
+                "extra_fields": {
+                    "event": {"action": "upstream_call_deadline_exceeded"},
+                    "upstream": {"service": "frontend-service"}
+                }
+            })
+            
+            raise HTTPException(status_code=504, detail=str(e))
+            
         except Exception as e:
             span.set_attribute("error", True)
             span.record_exception(e)
@@ -381,12 +760,172 @@ async def call_frontend():
             )
 
 
+class ProxyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that always runs `on_close` once sending ends, including
+    when the client disconnects before or during the body transfer
+    """
+    
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Shielded so cleanup still runs when the response task is cancelled
+            with anyio.CancelScope(shield=True):
+                await self.on_close()
+
+
+async def stream_frontend_endpoint(endpoint: str) -> StreamingResponse:
+    """
+    Stream a frontend endpoint back to the client without decoding it.
+    Status and selected headers are forwarded; the span and upstream metrics
+    cover the whole body transfer, and a client disconnect closes the
+    upstream request.
+    """
+    span = tracer.start_span("proxy-frontend-endpoint")
+    span.set_attribute("upstream.service", "frontend-service")
+    span.set_attribute("upstream.endpoint", f"/{endpoint}")
+    span.set_attribute("proxy.mode", "passthrough")
+    
+    logger.info(f"Proxying frontend service endpoint: /{endpoint}", extra={
+        "extra_fields": {
+            "event": {"action": "upstream_proxy_start"},
+            "upstream": {"service": "frontend-service", "endpoint": f"/{endpoint}"}
+        }
+    })
+    
+    start_time = time.time()
+    client = httpx.AsyncClient()
+    
+    try:
+        # Bounds connect/read/write phases (not the whole stream) by the deadline
+        timeout, headers = upstream_deadline()
+        # Make the proxy span current so the instrumented client parents to it
+        with trace.use_span(span, end_on_exit=False):
+            upstream_request = client.build_request(
+                "GET",
+                f"{FRONTEND_SERVICE_URL}/{endpoint}",
+                headers=headers,
+                timeout=httpx.Timeout(timeout) if timeout is not None else httpx.USE_CLIENT_DEFAULT
+            )
+            response = await client.send(upstream_request, stream=True)
+    except Exception as e:
+        await client.aclose()
+        span.set_attribute("error", True)
+        span.record_exception(e)
+        span.end()
+        
+        logger.error(f"Error calling frontend service: {str(e)}", extra={
+            "extra_fields": {
+                "event": {"action": "upstream_call_error"},
+                "upstream": {"service": "frontend-service", "endpoint": f"/{endpoint}"},
+                "error": {"message": str(e)}
+            }
+        }, exc_info=True)
+        
+        raise HTTPException(
+            status_code=504 if isinstance(e, (DeadlineExceeded, httpx.TimeoutException)) else 503,
+            detail=f"Frontend service unavailable: {str(e)}"
+        )
+    
+    observability.inc(
+        UPSTREAM_REQUEST_COUNT,
+        upstream_service="frontend-service",
+        method="GET",
+        status=response.status_code
+    )
+    span.set_attribute("upstream.status_code", response.status_code)
+    
+    transfer = {"bytes": 0, "completed": False, "error": None}
+    
+    async def body():
+        # Raw bytes: no decompression or decoding, content-encoding is forwarded
+        try:
+            async for chunk in response.aiter_raw():
+                transfer["bytes"] += len(chunk)
+                yield chunk
+        except httpx.HTTPError as e:
+            # Status and headers are already sent, so the failure can't change
+            # the response; record it and end the stream instead of raising
+            # into the ASGI server
+            transfer["error"] = e
+            span.set_attribute("error", True)
+            span.record_exception(e)
+            if timeout is not None and isinstance(e, httpx.TimeoutException):
+                observability.inc(DEADLINE_EXCEEDED, stage="upstream_body", service="backend-service")
+            return
+        transfer["completed"] = True
+    
+    async def close_upstream():
+        await response.aclose()
+        await client.aclose()
+        
+        duration = time.time() - start_time
+        observe_upstream_duration("frontend-service", "GET", duration)
+        
+        error = transfer["error"]
+        if transfer["completed"]:
+            action = "upstream_proxy_complete"
+        elif error is not None:
+            action = "upstream_proxy_failed"
+        else:
+            action = "upstream_proxy_cancelled"
+        span.set_attribute("upstream.response_bytes", transfer["bytes"])
+        span.set_attribute("upstream.cancelled", action == "upstream_proxy_cancelled")
+        span.end()
+        
+        extra_fields = {
+            "event": {"action": action},
+            "upstream": {
+                "service": "frontend-service",
+                "endpoint": f"/{endpoint}",
+                "status_code": response.status_code,
+                "response_bytes": transfer["bytes"],
+                "duration_ms": duration * 1000
+            }
+        }
+        if error is not None:
+            extra_fields["error"] = {"message": str(error), "type": type(error).__name__}
+            logger.error(
+                f"Frontend service /{endpoint} failed mid-body: {type(error).__name__} {str(error)}",
+                extra={"extra_fields": extra_fields}
+            )
+        else:
+            logger.info(f"Frontend service /{endpoint} proxied", extra={"extra_fields": extra_fields})
+    
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name.lower() in PASSTHROUGH_RESPONSE_HEADERS
+    }
+    
+    return ProxyStreamingResponse(
+        body(),
+        on_close=close_upstream,
+        status_code=response.status_code,
+        headers=headers
+    )
+
+
 @app.get("/call-frontend/{endpoint:path}")
-async def call_frontend_endpoint(endpoint: str):
+async def call_frontend_endpoint(endpoint: str, passthrough: Optional[bool] = None):
     """
     Call specific endpoint on frontend service
     Demonstrates parameterized service-to-service calls
+    
+    With ?passthrough=true (or FRONTEND_PROXY_MODE=passthrough) the upstream
+    response is streamed back unchanged instead of being wrapped
     """
+    if passthrough is None:
+        passthrough = FRONTEND_PROXY_MODE == "passthrough"
+    
+    if passthrough:
+        return await stream_frontend_endpoint(endpoint)
+    
     with tracer.start_as_current_span("call-frontend-endpoint") as span:
         span.set_attribute("upstream.service", "frontend-service")
         span.set_attribute("upstream.endpoint", f"/{endpoint}")
@@ -402,20 +941,18 @@ async def call_frontend_endpoint(endpoint: str):
             start_time = time.time()
             
             async with httpx.AsyncClient() as client:
-                response = await client.get(f"{FRONTEND_SERVICE_URL}/{endpoint}")
+                response = await upstream_get(client, f"{FRONTEND_SERVICE_URL}/{endpoint}")
                 
             duration = time.time() - start_time
             
-            UPSTREAM_REQUEST_COUNT.labels(
+            observability.inc(
+                UPSTREAM_REQUEST_COUNT,
                 upstream_service="frontend-service",
                 method="GET",
                 status=response.status_code
-            ).inc()
+            )
             
-            UPSTREAM_REQUEST_DURATION.labels(
-                upstream_service="frontend-service",
-                method="GET"
-            ).observe(duration)
+            observe_upstream_duration("frontend-service", "GET", duration)
             
             logger.info(f"Frontend service /{endpoint} responded", extra={
                 "extra_fields": {
@@ -454,6 +991,19 @@ async def call_frontend_endpoint(endpoint: str):
                 detail=f"Frontend service error: {e.response.text}"
             )
             
+        except DeadlineExceeded as e:
+            span.set_attribute("error", True)
+            span.record_exception(e)
+            
+            logger.warning(f"Deadline exceeded calling frontend service: {str(e)}", extra={
+                "extra_fields": {
+                    "event": {"action": "upstream_call_deadline_exceeded"},
+                    "upstream": {"service": "frontend-service", "endpoint": f"/{endpoint}"}
+                }
+            })
+            
+            raise HTTPException(status_code=504, detail=str(e))
+            
         except Exception as e:
             span.set_attribute("error", True)
             span.record_exception(e)
@@ -498,7 +1048,7 @@ async def distributed_trace():
                 
                 try:
                     async with httpx.AsyncClient() as client:
-                        response = await client.get(f"{FRONTEND_SERVICE_URL}/{ep}")
+                        response = await upstream_get(client, f"{FRONTEND_SERVICE_URL}/{ep}")
                         results[ep] = {
                             "status": "success",
                             "status_code": response.status_code
@@ -1,17 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from fastapi.responses import Response
+from prometheus_client import Counter, Histogram
 import time
+import math
 import logging
 import os
+import contextvars
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+# Shared instrumentation bootstrap (apps/shared/observability)
+from observability import latency_buckets, setup_observability
 
 # Database imports
 import redis
@@ -21,26 +22,23 @@ import pymysql
 from kafka import KafkaProducer
 import json
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging and OpenTelemetry
+observability = setup_observability("fastapi-example")
 logger = logging.getLogger(__name__)
-
-# Configure OpenTelemetry
-resource = Resource.create({"service.name": "fastapi-example"})
-trace.set_tracer_provider(TracerProvider(resource=resource))
 tracer = trace.get_tracer(__name__)
 
-# Configure OTLP exporter
-otlp_exporter = OTLPSpanExporter(
-    endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://otel-collector:4317"),
-    insecure=True
-)
-span_processor = BatchSpanProcessor(otlp_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
 # Prometheus metrics
 REQUEST_COUNT = Counter('app_requests_total', 'Total app requests', ['method', 'endpoint', 'status'])
-REQUEST_DURATION = Histogram('app_request_duration_seconds', 'Request duration', ['method', 'endpoint'])
+REQUEST_DURATION = Histogram(
+    'app_request_duration_seconds',
+    'Request duration',
+    ['method', 'endpoint'],
+    buckets=latency_buckets("REQUEST_DURATION_BUCKETS")
+)
+DEADLINE_EXCEEDED = Counter('app_deadline_exceeded_total', 'Requests abandoned because their deadline expired', ['stage'])
+REDIS_BATCH_DURATION = Histogram('app_redis_batch_duration_seconds', 'Redis call latency per request', ['mode'])
+REDIS_KEYS = Counter('app_redis_keys_total', 'Redis keys processed', ['mode', 'op'])
+REDIS_ROUND_TRIPS = Counter('app_redis_round_trips_total', 'Redis network round trips', ['mode'])
 
 # Create FastAPI app
 app = FastAPI(
@@ -49,12 +47,13 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Instrument FastAPI with OpenTelemetry
-FastAPIInstrumentor.instrument_app(app)
-
 # Database configuration from environment
 REDIS_HOST = os.getenv("REDIS_HOST", "redis-master")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+# Commands sent per pipeline round trip in /redis/batch
+REDIS_PIPELINE_CHUNK_SIZE = int(os.getenv("REDIS_PIPELINE_CHUNK_SIZE", "500"))
+REDIS_BATCH_MAX_OPERATIONS = int(os.getenv("REDIS_BATCH_MAX_OPERATIONS", "10000"))
 
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres-lb")
 POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
@@ -75,6 +74,126 @@ MONGODB_PASSWORD = os.getenv("MONGODB_PASSWORD", "changeme123")
 
 KAFKA_BROKERS = os.getenv("KAFKA_BROKERS", "kafka-lb:9092")
 
+class RedisOperation(BaseModel):
+    """Single operation in a Redis batch"""
+    op: Literal["get", "set", "delete"]
+    key: str
+    value: Optional[str] = None
+    ttl: Optional[int] = Field(None, gt=0, description="Expiry in seconds (set only)")
+
+
+class RedisBatchRequest(BaseModel):
+    """Batch of Redis operations executed in pipelined round trips"""
+    operations: List[RedisOperation] = Field(..., min_length=1)
+    transaction: bool = False
+    chunk_size: Optional[int] = Field(None, gt=0, description="Operations per round trip")
+
+# Deadline propagation: the header carries the caller's remaining budget in ms
+DEADLINE_HEADER = os.getenv("DEADLINE_HEADER", "x-request-timeout-ms")
+
+# Absolute deadline (time.monotonic()) of the request being handled
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current request's deadline, None if unbounded"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> Optional[float]:
+    """
+    Abandon the request with a 504 if its deadline has expired, otherwise
+    return the remaining budget in seconds (None if unbounded)
+    """
+    remaining = remaining_budget()
+    if remaining is not None and remaining <= 0:
+        observability.inc(DEADLINE_EXCEEDED, stage=stage)
+        logger.warning(f"Deadline exceeded before {stage}, abandoning request")
+        raise HTTPException(status_code=504, detail=f"Request deadline exceeded before {stage}")
+    return remaining
+
+
+def connect_timeout(remaining: Optional[float], default: Optional[int] = 10) -> Optional[int]:
+    """Whole-second timeout for drivers that only accept integers"""
+    if remaining is None:
+        return default
+    return max(1, math.ceil(remaining))
+
+
+class DeadlineConnection(redis.Connection):
+    """
+    Redis connection whose socket timeout shrinks to the remaining request
+    budget. redis-py only applies socket_timeout when a connection is opened,
+    so pooled connections re-apply it before every send and read.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_connect_timeout = self.socket_connect_timeout
+    
+    def _deadline_timeout(self, default: Optional[float]) -> Optional[float]:
+        remaining = remaining_budget()
+        if remaining is None:
+            return default
+        # A zero timeout would make the socket non-blocking; 1ms fails fast instead
+        remaining = max(remaining, 0.001)
+        return remaining if default is None else min(default, remaining)
+    
+    def connect(self):
+        self.socket_connect_timeout = self._deadline_timeout(self.default_connect_timeout)
+        super().connect()
+    
+    def send_packed_command(self, command, check_health=True):
+        if not self._sock:
+            self.connect()
+        self._sock.settimeout(self._deadline_timeout(self.socket_timeout))
+        super().send_packed_command(command, check_health=check_health)
+    
+    def read_response(self, *args, **kwargs):
+        if self._sock:
+            self._sock.settimeout(self._deadline_timeout(self.socket_timeout))
+        return super().read_response(*args, **kwargs)
+
+
+# Shared Redis connection pool, so single and batch timings are comparable;
+# every call is still bounded by the request deadline
+redis_pool = redis.ConnectionPool(
+    connection_class=DeadlineConnection,
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    decode_responses=True,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+)
+
+
+@app.middleware("http")
+async def deadline_middleware(request, call_next):
+    """Start the deadline clock from the incoming header and reject expired requests"""
+    budget_ms = request.headers.get(DEADLINE_HEADER)
+    if not budget_ms:
+        return await call_next(request)
+    
+    try:
+        budget = float(budget_ms) / 1000
+    except ValueError:
+        return JSONResponse(status_code=400, content={"detail": f"Invalid {DEADLINE_HEADER} header: {budget_ms}"})
+    
+    if budget <= 0:
+        observability.inc(DEADLINE_EXCEEDED, stage="arrival")
+        return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+    
+    token = request_deadline.set(time.monotonic() + budget)
+    try:
+        return await call_next(request)
+    finally:
+        request_deadline.reset(token)
+
 
 @app.middleware("http")
 async def prometheus_middleware(request, call_next):
@@ -82,20 +201,26 @@ async def prometheus_middleware(request, call_next):
     response = await call_next(request)
     duration = time.time() - start_time
     
-    REQUEST_COUNT.labels(
+    observability.inc(
+        REQUEST_COUNT,
         method=request.method,
         endpoint=request.url.path,
         status=response.status_code
-    ).inc()
-    
-    REQUEST_DURATION.labels(
+    )
+    observability.observe(
+        REQUEST_DURATION,
+        duration,
         method=request.method,
         endpoint=request.url.path
-    ).observe(duration)
+    )
     
     return response
 
 
+# Instrument FastAPI last so its server span wraps the middleware above
+observability.instrument_app(app)
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -107,10 +232,12 @@ async def root():
                 "/health",
                 "/metrics",
                 "/redis",
+                "/redis/batch",
                 "/postgres",
                 "/mysql",
                 "/mongodb",
-                "/kafka"
+                "/kafka",
+                "/debug/instrumentation"
             ]
         }
 
@@ -122,38 +249,144 @@ async def health():
 
 
 @app.get("/metrics")
-async def metrics():
+async def metrics(request: Request):
     """Prometheus metrics endpoint"""
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    return observability.metrics_response(request)
+
+
+@app.get("/debug/instrumentation")
+async def debug_instrumentation():
+    """Effective observability configuration and per-layer overhead"""
+    return observability.report()
 
 
 @app.get("/redis")
-async def test_redis():
-    """Test Redis connection"""
+def test_redis():
+    """
+    Test Redis connection
+    Plain def like /redis/batch, so both are timed in FastAPI's threadpool
+    """
     with tracer.start_as_current_span("redis-test"):
+        check_deadline("redis")
         try:
-            r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+            r = redis.Redis(connection_pool=redis_pool)
+            start_time = time.time()
             r.set("test_key", "test_value")
             value = r.get("test_key")
+            observability.observe(REDIS_BATCH_DURATION, time.time() - start_time, mode="single")
+            observability.inc(REDIS_KEYS, mode="single", op="set")
+            observability.inc(REDIS_KEYS, mode="single", op="get")
+            observability.inc(REDIS_ROUND_TRIPS, 2, mode="single")
             return {"status": "success", "service": "redis", "value": value}
         except Exception as e:
+            # A socket timeout once the budget is spent is the caller's deadline
+            if isinstance(e, redis.TimeoutError):
+                check_deadline("redis")
             logger.error(f"Redis error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Redis error: {str(e)}")
 
 
+@app.post("/redis/batch")
+def redis_batch(batch: RedisBatchRequest):
+    """
+    Run many Redis gets/sets/deletes in pipelined round trips
+    Each chunk of operations is one round trip (one MULTI/EXEC when transactional)
+    Plain def: redis-py blocks, so FastAPI runs this in its threadpool
+    """
+    with tracer.start_as_current_span("redis-batch") as span:
+        check_deadline("redis")
+        
+        if len(batch.operations) > REDIS_BATCH_MAX_OPERATIONS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch exceeds {REDIS_BATCH_MAX_OPERATIONS} operations"
+            )
+        for operation in batch.operations:
+            if operation.op == "set" and operation.value is None:
+                raise HTTPException(status_code=422, detail=f"Missing value for set of {operation.key}")
+        
+        mode = "transaction" if batch.transaction else "pipeline"
+        chunk_size = batch.chunk_size or REDIS_PIPELINE_CHUNK_SIZE
+        span.set_attribute("redis.batch.size", len(batch.operations))
+        span.set_attribute("redis.batch.mode", mode)
+        span.set_attribute("redis.batch.chunk_size", chunk_size)
+        
+        try:
+            r = redis.Redis(connection_pool=redis_pool)
+            start_time = time.time()
+            results = []
+            round_trips = 0
+            
+            for offset in range(0, len(batch.operations), chunk_size):
+                # Stop between round trips once the caller has given up. A
+                # transaction is only checked before its first chunk: failing
+                # after some chunks committed would hide writes that happened
+                if offset == 0 or not batch.transaction:
+                    check_deadline("redis-batch")
+                chunk = batch.operations[offset:offset + chunk_size]
+                pipe = r.pipeline(transaction=batch.transaction)
+                for operation in chunk:
+                    if operation.op == "get":
+                        pipe.get(operation.key)
+                    elif operation.op == "set":
+                        pipe.set(operation.key, operation.value, ex=operation.ttl)
+                    else:
+                        pipe.delete(operation.key)
+                results.extend(pipe.execute())
+                round_trips += 1
+            
+            duration = time.time() - start_time
+        except HTTPException:
+            raise
+        except Exception as e:
+            if isinstance(e, redis.TimeoutError):
+                check_deadline("redis-batch")
+            logger.error(f"Redis batch error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Redis error: {str(e)}")
+        
+        observability.observe(REDIS_BATCH_DURATION, duration, mode=mode)
+        observability.inc(REDIS_ROUND_TRIPS, round_trips, mode=mode)
+        op_counts = {}
+        for operation in batch.operations:
+            op_counts[operation.op] = op_counts.get(operation.op, 0) + 1
+        for op, count in op_counts.items():
+            observability.inc(REDIS_KEYS, count, mode=mode, op=op)
+        span.set_attribute("redis.batch.round_trips", round_trips)
+        
+        return {
+            "status": "success",
+            "service": "redis",
+            "mode": mode,
+            "operations": len(batch.operations),
+            "round_trips": round_trips,
+            "duration_ms": duration * 1000,
+            "keys_per_second": len(batch.operations) / duration if duration > 0 else None,
+            "results": [
+                {"op": operation.op, "key": operation.key, "result": result}
+                for operation, result in zip(batch.operations, results)
+            ]
+        }
+
+
 @app.get("/postgres")
 async def test_postgres():
     """Test PostgreSQL connection"""
     with tracer.start_as_current_span("postgres-test"):
+        remaining = check_deadline("postgres")
         try:
             conn = psycopg2.connect(
                 host=POSTGRES_HOST,
                 port=POSTGRES_PORT,
                 user=POSTGRES_USER,
                 password=POSTGRES_PASSWORD,
-                database=POSTGRES_DB
+                database=POSTGRES_DB,
+                connect_timeout=connect_timeout(remaining)
             )
             cur = conn.cursor()
+            remaining = remaining_budget()
+            if remaining is not None:
+                # Server-side cap so the query is cancelled once the caller gave up
+                cur.execute("SET statement_timeout = %s", (max(1, int(remaining * 1000)),))
             cur.execute("SELECT version();")
             version = cur.fetchone()[0]
             cur.close()
@@ -168,13 +401,16 @@ async def test_postgres():
 async def test_mysql():
     """Test MySQL connection"""
     with tracer.start_as_current_span("mysql-test"):
+        remaining = check_deadline("mysql")
         try:
             conn = pymysql.connect(
                 host=MYSQL_HOST,
                 port=MYSQL_PORT,
                 user=MYSQL_USER,
                 password=MYSQL_PASSWORD,
-                database=MYSQL_DB
+                database=MYSQL_DB,
+                connect_timeout=connect_timeout(remaining),
+                read_timeout=connect_timeout(remaining, default=None)
             )
             cur = conn.cursor()
             cur.execute("SELECT VERSION();")
@@ -191,8 +427,14 @@ async def test_mysql():
 async def test_mongodb():
     """Test MongoDB connection"""
     with tracer.start_as_current_span("mongodb-test"):
+        remaining = check_deadline("mongodb")
         try:
-            client = MongoClient(f"mongodb://{MONGODB_USER}:{MONGODB_PASSWORD}@{MONGODB_HOST}:{MONGODB_PORT}/")
+            timeout_ms = max(1, int(remaining * 1000)) if remaining is not None else None
+            client = MongoClient(
+                f"mongodb://{MONGODB_USER}:{MONGODB_PASSWORD}@{MONGODB_HOST}:{MONGODB_PORT}/",
+                serverSelectionTimeoutMS=timeout_ms or 30000,
+                timeoutMS=timeout_ms
+            )
             db = client.admin
             server_info = db.command("serverStatus")
             version = server_info.get("version", "unknown")
@@ -207,15 +449,20 @@ async def test_mongodb():
 async def test_kafka():
     """Test Kafka connection"""
     with tracer.start_as_current_span("kafka-test"):
+        check_deadline("kafka")
         try:
             producer = KafkaProducer(
                 bootstrap_servers=KAFKA_BROKERS,
                 value_serializer=lambda v: json.dumps(v).encode('utf-8')
             )
-            message = {"test": "message", "timestamp": time.time()}
-            future = producer.send('test-topic', message)
-            result = future.get(timeout=10)
-            producer.close()
+            try:
+                # Bootstrapping the producer can use up much of the budget
+                remaining = check_deadline("kafka")
+                message = {"test": "message", "timestamp": time.time()}
+                future = producer.send('test-topic', message)
+                result = future.get(timeout=min(10, remaining) if remaining is not None else 10)
+            finally:
+                producer.close()
             return {
                 "status": "success",
                 "service": "kafka",
@@ -223,6 +470,8 @@ async def test_kafka():
                 "partition": result.partition,
                 "offset": result.offset
             }
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Kafka error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Kafka error: {str(e)}")
@@ -0,0 +1,27 @@
+"""
+Shared observability bootstrap for the example services
+
+Usage:
+    observability = setup_observability("backend-service")
+    app = FastAPI(...)
+    # ... register HTTP middleware ...
+    observability.instrument_app(app)
+"""
+
+from .bootstrap import Observability, setup_observability
+from .config import ObservabilityConfig
+from .metrics import DEFAULT_LATENCY_BUCKETS, latency_buckets, metrics_response, trace_exemplar
+from .overhead import InstrumentationOverhead
+from .structured_logging import StructuredJSONFormatter
+
+__all__ = [
+    "DEFAULT_LATENCY_BUCKETS",
+    "InstrumentationOverhead",
+    "Observability",
+    "ObservabilityConfig",
+    "StructuredJSONFormatter",
+    "latency_buckets",
+    "metrics_response",
+    "setup_observability",
+    "trace_exemplar"
+]
@@ -0,0 +1,187 @@
+"""
+Instrumentation bootstrap shared by the example services
+
+Sets up logging, tracing (resource, sampler, OTLP exporter, batch processor,
+propagator) and Prometheus overhead reporting from ObservabilityConfig, and
+instruments the FastAPI app and the httpx client when available.
+"""
+
+import logging
+import os
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from opentelemetry import trace
+from opentelemetry.propagate import set_global_textmap
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from prometheus_client import REGISTRY
+
+from .config import ObservabilityConfig
+from .metrics import metrics_response, trace_exemplar
+from .overhead import (
+    InstrumentationOverhead,
+    OverheadCollector,
+    ServerInstrumentationTimer,
+    TimedSpanExporter,
+    TimedSpanProcessor
+)
+from .structured_logging import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Request headers recorded as server span attributes by the OpenTelemetry ASGI middleware
+CAPTURE_HEADERS_ENV = "OTEL_INSTRUMENTATION_HTTP_CAPTURE_HEADERS_SERVER_REQUEST"
+
+
+def create_span_exporter(config: ObservabilityConfig):
+    """OTLP span exporter for the configured protocol and compression"""
+    if config.otlp_protocol == "grpc":
+        from grpc import Compression
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(
+            endpoint=config.otlp_endpoint,
+            insecure=config.otlp_insecure,
+            compression=Compression.Gzip if config.otlp_compression == "gzip" else Compression.NoCompression,
+            timeout=max(1, config.bsp_export_timeout_ms // 1000)
+        )
+
+    from opentelemetry.exporter.otlp.proto.http import Compression
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+    # OTEL_EXPORTER_OTLP_ENDPOINT is a base URL; the HTTP signal path is appended
+    endpoint = config.otlp_endpoint.rstrip("/")
+    if not endpoint.endswith("/v1/traces"):
+        endpoint = f"{endpoint}/v1/traces"
+    return OTLPSpanExporter(
+        endpoint=endpoint,
+        compression=Compression.Gzip if config.otlp_compression == "gzip" else Compression.NoCompression,
+        timeout=max(1, config.bsp_export_timeout_ms // 1000)
+    )
+
+
+class Observability:
+    """Handle on the configured instrumentation layers of a service"""
+
+    def __init__(self, config: ObservabilityConfig):
+        self.config = config
+        self.overhead = InstrumentationOverhead()
+        self.tracer_provider: Optional[TracerProvider] = None
+
+    def setup(self):
+        setup_logging(self.config, self.overhead)
+        if self.config.traces_enabled:
+            self._setup_tracing()
+        if self.config.metrics_enabled:
+            REGISTRY.register(OverheadCollector(self.overhead))
+
+        logger.info(
+            f"Observability configured (profile={self.config.profile})",
+            extra={"extra_fields": {"observability": self.config.as_dict()}}
+        )
+
+    def _setup_tracing(self):
+        resource = Resource.create({
+            "service.name": self.config.service_name,
+            "service.version": self.config.service_version,
+            "deployment.environment": self.config.environment
+        })
+        self.tracer_provider = TracerProvider(
+            resource=resource,
+            sampler=ParentBased(TraceIdRatioBased(self.config.trace_sample_ratio))
+        )
+
+        span_processor = BatchSpanProcessor(
+            TimedSpanExporter(create_span_exporter(self.config), self.overhead),
+            max_queue_size=self.config.bsp_max_queue_size,
+            max_export_batch_size=self.config.bsp_max_export_batch_size,
+            schedule_delay_millis=self.config.bsp_schedule_delay_ms,
+            export_timeout_millis=self.config.bsp_export_timeout_ms
+        )
+        self.tracer_provider.add_span_processor(TimedSpanProcessor(span_processor, self.overhead))
+        trace.set_tracer_provider(self.tracer_provider)
+
+        # Set global propagator for context propagation
+        set_global_textmap(TraceContextTextMapPropagator())
+
+        # Context is automatically propagated on outgoing httpx calls
+        try:
+            from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+        except ImportError:
+            logger.info("opentelemetry-instrumentation-httpx not installed, skipping httpx instrumentation")
+        else:
+            HTTPXClientInstrumentor().instrument(tracer_provider=self.tracer_provider)
+
+    def instrument_app(self, app: FastAPI):
+        """
+        Instrument the FastAPI app. Call after registering HTTP middleware so the
+        server span is outermost and the trace ID is visible to the middleware.
+        """
+        if not self.config.traces_enabled:
+            return
+
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+        # The ASGI middleware takes no header list argument; it reads this
+        # process-wide env var on every request. Set or clear it so that
+        # OBS_CAPTURE_HEADERS wins over a pre-set value in both directions.
+        if self.config.capture_headers and self.config.span_headers:
+            os.environ[CAPTURE_HEADERS_ENV] = self.config.span_headers
+        else:
+            os.environ.pop(CAPTURE_HEADERS_ENV, None)
+        # The instrumentor adds its middleware outermost; bracket it with timers
+        app.add_middleware(ServerInstrumentationTimer, overhead=self.overhead, outer=False)
+        FastAPIInstrumentor.instrument_app(app, tracer_provider=self.tracer_provider)
+        app.add_middleware(ServerInstrumentationTimer, overhead=self.overhead, outer=True)
+
+    def request_headers(self, request: Request) -> Optional[dict]:
+        """Request headers for logging, or None when header capture is off"""
+        if not self.config.capture_headers:
+            return None
+        with self.overhead.measure("header_capture"):
+            return dict(request.headers)
+
+    def inc(self, counter, amount: float = 1, **labels):
+        """Increment a counter, unless metrics are off; the cost counts as metrics overhead"""
+        if not self.config.metrics_enabled:
+            return
+        with self.overhead.measure("metrics"):
+            (counter.labels(**labels) if labels else counter).inc(amount)
+
+    def observe(self, histogram, value: float, exemplar: Optional[dict] = None, **labels):
+        """
+        Observe a histogram value, unless metrics are off, with the current
+        trace as exemplar; the cost counts as metrics overhead. Callers that
+        already hold the trace ID pass the exemplar ({} for none).
+        """
+        if not self.config.metrics_enabled:
+            return
+        with self.overhead.measure("metrics"):
+            (histogram.labels(**labels) if labels else histogram).observe(
+                value,
+                exemplar=exemplar if exemplar is not None else trace_exemplar()
+            )
+
+    def metrics_response(self, request: Request) -> Response:
+        if not self.config.metrics_enabled:
+            return Response(status_code=404)
+        return metrics_response(request)
+
+    def report(self) -> dict:
+        """Effective configuration and per-layer overhead since startup"""
+        return {
+            "config": self.config.as_dict(),
+            "overhead": self.overhead.snapshot()
+        }
+
+
+def setup_observability(service_name: str, service_version: str = "1.0.0") -> Observability:
+    """Configure every instrumentation layer of a service from env"""
+    observability = Observability(ObservabilityConfig.from_env(service_name, service_version))
+    observability.setup()
+    return observability
@@ -0,0 +1,156 @@
+"""
+Observability configuration from environment variables
+
+OBSERVABILITY_PROFILE picks the defaults for every layer switch:
+- full: traces (100% sampled), metrics, structured JSON logs, header capture
+- lean: traces (10% sampled), metrics, plain logs, no header capture
+Each switch can still be overridden individually.
+"""
+
+import os
+from typing import Optional
+
+
+PROFILES = {
+    "full": {
+        "traces_enabled": True,
+        "trace_sample_ratio": 1.0,
+        "metrics_enabled": True,
+        "structured_logs_enabled": True,
+        "capture_headers": True
+    },
+    "lean": {
+        "traces_enabled": True,
+        "trace_sample_ratio": 0.1,
+        "metrics_enabled": True,
+        "structured_logs_enabled": False,
+        "capture_headers": False
+    }
+}
+
+DEFAULT_OTLP_ENDPOINTS = {
+    "grpc": "http://otel-collector:4317",
+    "http/protobuf": "http://otel-collector:4318"
+}
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """Boolean env var ("true"/"1"/"yes"/"on"), default when unset"""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("true", "1", "yes", "on")
+
+
+class ObservabilityConfig:
+    """Settings for every instrumentation layer of a service"""
+
+    def __init__(
+        self,
+        service_name: str,
+        service_version: str = "1.0.0",
+        environment: str = "development",
+        profile: str = "full",
+        traces_enabled: bool = True,
+        trace_sample_ratio: float = 1.0,
+        metrics_enabled: bool = True,
+        structured_logs_enabled: bool = True,
+        capture_headers: bool = True,
+        span_headers: str = "content-type,user-agent,x-request-timeout-ms",
+        log_level: str = "INFO",
+        otlp_protocol: str = "grpc",
+        otlp_endpoint: Optional[str] = None,
+        otlp_insecure: bool = True,
+        otlp_compression: str = "gzip",
+        bsp_max_queue_size: int = 2048,
+        bsp_max_export_batch_size: int = 512,
+        bsp_schedule_delay_ms: int = 5000,
+        bsp_export_timeout_ms: int = 30000
+    ):
+        if otlp_protocol == "http":
+            otlp_protocol = "http/protobuf"
+        if otlp_protocol not in DEFAULT_OTLP_ENDPOINTS:
+            raise ValueError(f"Unsupported OTLP protocol: {otlp_protocol}")
+        if otlp_compression not in ("gzip", "none"):
+            raise ValueError(f"Unsupported OTLP compression: {otlp_compression}")
+
+        self.service_name = service_name
+        self.service_version = service_version
+        self.environment = environment
+        self.profile = profile
+        self.traces_enabled = traces_enabled
+        self.trace_sample_ratio = trace_sample_ratio
+        self.metrics_enabled = metrics_enabled
+        self.structured_logs_enabled = structured_logs_enabled
+        self.capture_headers = capture_headers
+        self.span_headers = span_headers
+        self.log_level = log_level
+        self.otlp_protocol = otlp_protocol
+        self.otlp_endpoint = otlp_endpoint or DEFAULT_OTLP_ENDPOINTS[otlp_protocol]
+        self.otlp_insecure = otlp_insecure
+        self.otlp_compression = otlp_compression
+        self.bsp_max_queue_size = bsp_max_queue_size
+        self.bsp_max_export_batch_size = bsp_max_export_batch_size
+        self.bsp_schedule_delay_ms = bsp_schedule_delay_ms
+        self.bsp_export_timeout_ms = bsp_export_timeout_ms
+
+    @classmethod
+    def from_env(cls, service_name: str, service_version: str = "1.0.0") -> "ObservabilityConfig":
+        """Build the config from env, using the profile for unset layer switches"""
+        profile = os.getenv("OBSERVABILITY_PROFILE", "full").lower()
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown OBSERVABILITY_PROFILE: {profile}")
+        defaults = PROFILES[profile]
+
+        return cls(
+            service_name=os.getenv("SERVICE_NAME", service_name),
+            service_version=os.getenv("SERVICE_VERSION", service_version),
+            environment=os.getenv("ENVIRONMENT", "development"),
+            profile=profile,
+            traces_enabled=env_flag("OBS_TRACES_ENABLED", defaults["traces_enabled"]),
+            trace_sample_ratio=float(
+                os.getenv("OBS_TRACE_SAMPLE_RATIO", defaults["trace_sample_ratio"])
+            ),
+            metrics_enabled=env_flag("OBS_METRICS_ENABLED", defaults["metrics_enabled"]),
+            structured_logs_enabled=env_flag(
+                "OBS_STRUCTURED_LOGS_ENABLED", defaults["structured_logs_enabled"]
+            ),
+            capture_headers=env_flag("OBS_CAPTURE_HEADERS", defaults["capture_headers"]),
+            span_headers=os.getenv("OBS_SPAN_HEADERS", "content-type,user-agent,x-request-timeout-ms"),
+            log_level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            otlp_protocol=os.getenv("OTEL_EXPORTER_OTLP_PROTOCOL", "grpc").lower(),
+            otlp_endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"),
+            otlp_insecure=env_flag("OTEL_EXPORTER_OTLP_INSECURE", True),
+            otlp_compression=os.getenv("OTEL_EXPORTER_OTLP_COMPRESSION", "gzip").lower(),
+            bsp_max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "2048")),
+            bsp_max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "512")),
+            bsp_schedule_delay_ms=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "5000")),
+            bsp_export_timeout_ms=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "30000"))
+        )
+
+    def as_dict(self) -> dict:
+        """Effective settings, for the /debug/instrumentation endpoint"""
+        return {
+            "service": {
+                "name": self.service_name,
+                "version": self.service_version,
+                "environment": self.environment
+            },
+            "profile": self.profile,
+            "layers": {
+                "traces": self.traces_enabled,
+                "metrics": self.metrics_enabled,
+                "structured_logs": self.structured_logs_enabled,
+                "header_capture": self.capture_headers
+            },
+            "traces": {
+                "sample_ratio": self.trace_sample_ratio,
+                "otlp_protocol": self.otlp_protocol,
+                "otlp_endpoint": self.otlp_endpoint,
+                "otlp_compression": self.otlp_compression,
+                "max_queue_size": self.bsp_max_queue_size,
+                "max_export_batch_size": self.bsp_max_export_batch_size,
+                "schedule_delay_ms": self.bsp_schedule_delay_ms,
+                "export_timeout_ms": self.bsp_export_timeout_ms
+            }
+        }
@@ -0,0 +1,48 @@
+"""
+Prometheus helpers: latency bucket layouts, trace exemplars and exposition
+"""
+
+import os
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from opentelemetry import trace
+from prometheus_client import REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.openmetrics.exposition import (
+    CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE_LATEST,
+    generate_latest as generate_openmetrics_latest
+)
+
+
+# Latency histogram buckets: dense around the 50ms-1s SLO range, up to 60s
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.25,
+    0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0
+)
+
+
+def latency_buckets(env_var: str) -> tuple:
+    """Histogram buckets from a comma-separated env var (seconds), else the defaults"""
+    value = os.getenv(env_var)
+    if not value:
+        return DEFAULT_LATENCY_BUCKETS
+    return tuple(sorted(float(bucket) for bucket in value.split(",") if bucket.strip()))
+
+
+def trace_exemplar() -> Optional[dict]:
+    """OpenMetrics exemplar linking an observation to the current sampled trace"""
+    ctx = trace.get_current_span().get_span_context()
+    if not ctx.is_valid or not ctx.trace_flags.sampled:
+        return None
+    return {"trace_id": format(ctx.trace_id, '032x')}
+
+
+def metrics_response(request: Request) -> Response:
+    """
+    Prometheus exposition for the /metrics endpoint
+    Serves OpenMetrics (with trace exemplars) when the scraper asks for it
+    """
+    if "application/openmetrics-text" in request.headers.get("accept", ""):
+        return Response(generate_openmetrics_latest(REGISTRY), media_type=OPENMETRICS_CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,153 @@
+"""
+Per-layer instrumentation overhead accounting
+
+Each layer (traces_server, traces_processing, traces_export, metrics, logging,
+header_capture) reports the wall time it spends in-process, so a lean or full
+profile can be chosen per service from data rather than guesswork.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExporter
+from prometheus_client.core import CounterMetricFamily
+
+
+class InstrumentationOverhead:
+    """Operation counts and time spent per instrumentation layer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, layer: str, seconds: float):
+        with self._lock:
+            operations, total = self._totals.get(layer, (0, 0.0))
+            self._totals[layer] = (operations + 1, total + seconds)
+
+    @contextmanager
+    def measure(self, layer: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(layer, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            totals = dict(self._totals)
+        return {
+            layer: {
+                "operations": operations,
+                "total_ms": total * 1000,
+                "avg_us": total / operations * 1e6 if operations else 0.0,
+            }
+            for layer, (operations, total) in sorted(totals.items())
+        }
+
+
+class OverheadCollector:
+    """
+    Prometheus collector exposing the overhead totals at scrape time,
+    so accounting adds no metric updates to the hot path
+    """
+
+    def __init__(self, overhead: InstrumentationOverhead):
+        self.overhead = overhead
+
+    def collect(self):
+        seconds = CounterMetricFamily(
+            'instrumentation_overhead_seconds',
+            'Time spent in each instrumentation layer',
+            labels=['layer']
+        )
+        operations = CounterMetricFamily(
+            'instrumentation_overhead_operations',
+            'Operations performed by each instrumentation layer',
+            labels=['layer']
+        )
+        for layer, stats in self.overhead.snapshot().items():
+            seconds.add_metric([layer], stats["total_ms"] / 1000)
+            operations.add_metric([layer], stats["operations"])
+        yield seconds
+        yield operations
+
+
+class TimedSpanProcessor(SpanProcessor):
+    """
+    Span processor wrapper recording the time spent handing spans to the
+    processor (for the batch processor: queueing them for export)
+    """
+
+    def __init__(self, delegate: SpanProcessor, overhead: InstrumentationOverhead):
+        self.delegate = delegate
+        self.overhead = overhead
+
+    def on_start(self, span, parent_context=None):
+        with self.overhead.measure("traces_processing"):
+            self.delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span):
+        with self.overhead.measure("traces_processing"):
+            self.delegate.on_end(span)
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+class TimedSpanExporter(SpanExporter):
+    """
+    Span exporter wrapper recording the time spent serialising and sending
+    batches. Runs on the batch processor's worker thread, off the request path,
+    and includes network time and the exporter's retry backoff.
+    """
+
+    def __init__(self, delegate: SpanExporter, overhead: InstrumentationOverhead):
+        self.delegate = delegate
+        self.overhead = overhead
+
+    def export(self, spans):
+        with self.overhead.measure("traces_export"):
+            return self.delegate.export(spans)
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+class ServerInstrumentationTimer:
+    """
+    ASGI middleware registered on both sides of the OpenTelemetry server
+    middleware. The inner instance stores the time spent below it in the scope;
+    the outer one records its own total minus that as "traces_server", i.e.
+    server span creation, attributes, header capture and the wrapped send.
+    """
+
+    SCOPE_KEY = "observability.inner_seconds"
+
+    def __init__(self, app, overhead: InstrumentationOverhead, outer: bool):
+        self.app = app
+        self.overhead = overhead
+        self.outer = outer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.outer:
+                self.overhead.record("traces_server", max(0.0, elapsed - scope.pop(self.SCOPE_KEY, elapsed)))
+            else:
+                scope[self.SCOPE_KEY] = elapsed
@@ -0,0 +1,123 @@
+"""
+Structured JSON logging with trace correlation (ECS-compatible)
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+
+from opentelemetry import trace
+
+from .config import ObservabilityConfig
+from .overhead import InstrumentationOverhead
+
+
+# Custom JSON formatter for structured logging with trace correlation
+class StructuredJSONFormatter(logging.Formatter):
+    """
+    Structured JSON log formatter compatible with ECS (Elastic Common Schema)
+    Includes trace context for log-trace correlation
+    """
+
+    def __init__(self, config: ObservabilityConfig):
+        super().__init__()
+        # Static metadata is resolved once instead of on every record
+        self.service = {
+            "name": config.service_name,
+            "version": config.service_version,
+            "environment": config.environment
+        }
+        self.process = {"pid": os.getpid()}
+        self.host = {"hostname": os.getenv("HOSTNAME", "localhost")}
+
+    def format(self, record):
+        # Get current trace context
+        current_span = trace.get_current_span()
+        trace_id = None
+        span_id = None
+
+        if current_span and current_span.get_span_context().is_valid:
+            ctx = current_span.get_span_context()
+            trace_id = format(ctx.trace_id, '032x')
+            span_id = format(ctx.span_id, '016x')
+
+        # Build structured log entry
+        log_data = {
+            # Timestamp
+            "@timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+
+            # Log metadata
+            "log": {
+                "level": record.levelname,
+                "logger": record.name,
+                "origin": {
+                    "file": {
+                        "name": record.filename,
+                        "line": record.lineno
+                    },
+                    "function": record.funcName
+                }
+            },
+
+            # Message
+            "message": record.getMessage(),
+
+            # Service metadata
+            "service": self.service,
+
+            # Trace context (for log-trace correlation)
+            "trace": {
+                "id": trace_id,
+                "span_id": span_id
+            } if trace_id else {},
+
+            # Process metadata
+            "process": self.process,
+
+            # Host metadata
+            "host": self.host
+        }
+
+        # Add exception info if present
+        if record.exc_info:
+            log_data["error"] = {
+                "type": record.exc_info[0].__name__ if record.exc_info[0] else None,
+                "message": str(record.exc_info[1]) if record.exc_info[1] else None,
+                "stack_trace": self.formatException(record.exc_info)
+            }
+
+        # Add custom fields from extra
+        if hasattr(record, 'extra_fields'):
+            log_data.update(record.extra_fields)
+
+        return json.dumps(log_data)
+
+
+class TimedStreamHandler(logging.StreamHandler):
+    """Stream handler recording time spent formatting and writing records"""
+
+    def __init__(self, overhead: InstrumentationOverhead):
+        super().__init__()
+        self.overhead = overhead
+
+    def emit(self, record):
+        with self.overhead.measure("logging"):
+            super().emit(record)
+
+
+def setup_logging(config: ObservabilityConfig, overhead: InstrumentationOverhead):
+    """Configure root logging: structured JSON, or plain text in lean profiles"""
+    root = logging.getLogger()
+    root.setLevel(config.log_level)
+
+    # Remove default handlers
+    root.handlers = []
+
+    handler = TimedStreamHandler(overhead)
+    if config.structured_logs_enabled:
+        handler.setFormatter(StructuredJSONFormatter(config))
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    root.addHandler(handler)